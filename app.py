@@ -2,11 +2,31 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import csr_matrix, load_npz, save_npz
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+from annoy import AnnoyIndex
+from numba import njit, prange
 import plotly.express as px
 import plotly.graph_objects as go
 from sqlalchemy import create_engine
 import urllib
+from pathlib import Path
+from datetime import date
+
+# Parâmetros da busca de vizinhos
+# Até LIMITE_NNZ_BUSCA_EXATA interações a varredura esparsa exata custa ~50 ms por consulta;
+# acima disso os candidatos vêm dos embeddings SVD (varredura numba até
+# LIMITE_CLIENTES_VARREDURA clientes, índice Annoy além) e são reordenados pelo cosseno exato
+LIMITE_NNZ_BUSCA_EXATA = 10_000_000
+LIMITE_CLIENTES_VARREDURA = 2_000_000
+DIMENSAO_EMBEDDINGS = 64
+N_ARVORES_INDICE = 50
+FATOR_CANDIDATOS = 10
+ESCALA_QUANTIZACAO = 127.0  # embeddings da varredura numba guardados em int8
+
+# Diretório para os artefatos do modelo salvos em disco (matriz, embeddings e índice)
+DIRETORIO_CACHE = Path(__file__).parent / "cache_modelo"
 
 # Configuração da página
 st.set_page_config(
@@ -39,29 +59,38 @@ def criar_conexao_banco():
     engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}",pool_pre_ping=True)
     return engine
 
+# Função para identificar uma versão dos dados
+def calcular_versao(df):
+    """Retorna uma impressão digital (hash) do conteúdo do DataFrame, usada como chave de cache"""
+    return int(pd.util.hash_pandas_object(df, index=False).sum())
+
 # Função para carregar dados
-@st.cache_data
-def carregar_dados():
-    """Carrega os dados necessários do banco"""
+@st.cache_data(persist="disk", show_spinner=False)
+def carregar_dados(data_carga):
+    """Carrega os dados necessários do banco (cache em disco, renovado a cada `data_carga`)"""
     engine = criar_conexao_banco()
     
     # Carregar vendas
     query_vendas = """
         SELECT
         v.CustomerKey,
-        v.ProductKey,
-        SUM(v.SalesQuantity) as TotalQtd
+        v.ProductKey
         FROM vw_FactOnlineSales v
         INNER JOIN DimCustomer c ON v.CustomerKey = c.CustomerKey
         WHERE c.CustomerType = 'Person' -- Filtra apenas pessoas físicas
         GROUP BY v.CustomerKey, v.ProductKey
+        HAVING SUM(v.SalesQuantity) > 0 -- Descarta pares sem compra líquida (devoluções)
         """
     
-    df_vendas = pd.read_sql(query_vendas, engine)
+    df_vendas = pd.read_sql(query_vendas, engine, dtype_backend='pyarrow').astype(
+        {'CustomerKey': 'int32', 'ProductKey': 'int32'}
+    )
     
     # Carregar produtos
     query_produtos = "SELECT ProductKey, ProductName FROM vw_DimProduct"
-    df_produtos = pd.read_sql(query_produtos, engine)
+    df_produtos = pd.read_sql(query_produtos, engine, dtype_backend='pyarrow').astype(
+        {'ProductKey': 'int32', 'ProductName': 'string[pyarrow]'}
+    )
     
     # Carregar clientes
     query_clientes = """
@@ -73,83 +102,262 @@ def carregar_dados():
     FROM vw_DimCustomer 
     WHERE CustomerType = 'Person'
     """
-    df_clientes = pd.read_sql(query_clientes, engine)
+    df_clientes = pd.read_sql(query_clientes, engine, dtype_backend='pyarrow').astype(
+        {'CustomerKey': 'int32', 'nome_completo': 'string[pyarrow]'}
+    )
+    df_clientes['primeiro_nome'] = df_clientes['nome_completo'].str.split(n=1).str[0]
+    
+    # Versões calculadas uma única vez por carga (chaves dos caches do modelo e dos mapeamentos)
+    versao_vendas = calcular_versao(df_vendas)
+    versao_clientes = calcular_versao(df_clientes)
+    versao_produtos = calcular_versao(df_produtos)
     
-    return df_vendas, df_produtos, df_clientes
+    return df_vendas, df_produtos, df_clientes, versao_vendas, versao_clientes, versao_produtos
 
 # Função para criar matriz de interação
 def criar_matriz_interacao(df_vendas):
-    """Cria a matriz cliente x produto"""
-    matriz = df_vendas.pivot_table(
-        index='CustomerKey',
-        columns='ProductKey',
-        values='TotalQtd',
-        fill_value=0
+    """Cria a matriz esparsa binária cliente x produto (CSR, 1 = comprou) e os índices de linhas/colunas"""
+    # Mapear CustomerKey/ProductKey para posições inteiras de linha/coluna
+    cust_idx, cust_index = pd.factorize(df_vendas['CustomerKey'])
+    prod_idx, prod_index = pd.factorize(df_vendas['ProductKey'])
+    
+    matriz = csr_matrix(
+        (np.ones(len(df_vendas), dtype=np.float32), (cust_idx, prod_idx)),
+        shape=(len(cust_index), len(prod_index))
     )
-    return matriz
+    return matriz, pd.Index(cust_index), pd.Index(prod_index)
+
+# Função para criar embeddings densos dos clientes
+def criar_embeddings(matriz_norm):
+    """Reduz a matriz normalizada a embeddings densos (SVD truncado) com norma unitária"""
+    # Catálogo pequeno: as próprias linhas densas já servem de embeddings
+    if matriz_norm.shape[1] <= DIMENSAO_EMBEDDINGS:
+        return matriz_norm.toarray().astype(np.float32)
+    
+    svd = TruncatedSVD(n_components=DIMENSAO_EMBEDDINGS, random_state=42)
+    embeddings = svd.fit_transform(matriz_norm)
+    return normalize(embeddings, norm='l2', axis=1).astype(np.float32)
+
+# Função para criar o índice de vizinhos aproximados
+def criar_indice_vizinhos(embeddings, versao_modelo):
+    """Carrega do disco (ou constrói e salva) o índice Annoy sobre os embeddings dos clientes"""
+    indice = AnnoyIndex(embeddings.shape[1], 'angular')
+    caminho = DIRETORIO_CACHE / f"indice_vizinhos_{versao_modelo}.ann"
+    if caminho.exists():
+        indice.load(str(caminho))
+        return indice
+    
+    for row_id, vetor in enumerate(embeddings):
+        indice.add_item(row_id, vetor)
+    indice.build(N_ARVORES_INDICE)
+    
+    DIRETORIO_CACHE.mkdir(parents=True, exist_ok=True)
+    indice.save(str(caminho))
+    return indice
+
+# Função para quantizar embeddings de norma unitária
+def quantizar_embeddings(embeddings):
+    """Converte embeddings (componentes em [-1, 1]) para int8, com 1/4 da memória do float32"""
+    return np.round(embeddings * ESCALA_QUANTIZACAO).astype(np.int8)
+
+# Função para calcular a similaridade entre um embedding e todos os demais
+@njit(parallel=True, fastmath=True, cache=True)
+def similaridades_embeddings(embeddings, consulta):
+    """Produto interno (int8, acumulado em int32) de cada embedding quantizado com a consulta"""
+    n_clientes, dimensao = embeddings.shape
+    escala = np.float32(1.0 / (ESCALA_QUANTIZACAO * ESCALA_QUANTIZACAO))
+    similaridades = np.empty(n_clientes, dtype=np.float32)
+    for i in prange(n_clientes):
+        total = np.int32(0)
+        for j in range(dimensao):
+            total += np.int32(embeddings[i, j]) * np.int32(consulta[j])
+        similaridades[i] = total * escala
+    return similaridades
+
+# Função para remover clientes e produtos com poucas compras (cold start)
+def filtrar_cold_start(df_vendas, min_compras_cliente, min_compras_produto):
+    """Mantém apenas clientes e produtos com o número mínimo de compras (pares cliente-produto)"""
+    compras_cliente = df_vendas.groupby('CustomerKey')['ProductKey'].transform('size')
+    compras_produto = df_vendas.groupby('ProductKey')['CustomerKey'].transform('size')
+    return df_vendas[
+        (compras_cliente >= min_compras_cliente) & (compras_produto >= min_compras_produto)
+    ]
+
+# Função para obter a matriz de interação salva em disco
+def obter_matriz_interacao(df_vendas, versao_modelo, min_compras_cliente, min_compras_produto):
+    """Carrega do disco (ou constrói e salva) a matriz de interação e os índices de linhas/colunas"""
+    caminho_matriz = DIRETORIO_CACHE / f"matriz_{versao_modelo}.npz"
+    caminho_indices = DIRETORIO_CACHE / f"indices_{versao_modelo}.npz"
+    if caminho_matriz.exists() and caminho_indices.exists():
+        indices = np.load(caminho_indices)
+        return load_npz(caminho_matriz).tocsr(), pd.Index(indices['clientes']), pd.Index(indices['produtos'])
+    
+    df_filtrado = filtrar_cold_start(df_vendas, min_compras_cliente, min_compras_produto)
+    matriz, cust_index, prod_index = criar_matriz_interacao(df_filtrado)
+    
+    DIRETORIO_CACHE.mkdir(parents=True, exist_ok=True)
+    save_npz(caminho_matriz, matriz)
+    np.savez(caminho_indices, clientes=cust_index.to_numpy(), produtos=prod_index.to_numpy())
+    return matriz, cust_index, prod_index
+
+# Função para obter os embeddings salvos em disco
+def obter_embeddings(matriz_norm, versao_modelo):
+    """Carrega do disco (ou calcula e salva) os embeddings densos dos clientes"""
+    caminho = DIRETORIO_CACHE / f"embeddings_{versao_modelo}.npy"
+    if caminho.exists():
+        return np.load(caminho)
+    
+    embeddings = criar_embeddings(matriz_norm)
+    DIRETORIO_CACHE.mkdir(parents=True, exist_ok=True)
+    np.save(caminho, embeddings)
+    return embeddings
 
-# Função para calcular similaridades
-def calcular_similaridades(matriz):
-    """Calcula a matriz de similaridade entre clientes"""
-    similaridade = cosine_similarity(matriz)
-    df_similaridade = pd.DataFrame(
-        similaridade,
-        index=matriz.index,
-        columns=matriz.index
+# Função para preparar o modelo (matriz de interação + matriz normalizada + índice)
+@st.cache_resource
+def preparar_modelo(_df_vendas, versao_vendas, min_compras_cliente, min_compras_produto):
+    """Constrói a matriz de interação, sua versão normalizada (L2) e, para bases grandes, os embeddings e o índice"""
+    # O cache é indexado por versao_vendas e pelos filtros; o DataFrame em si não é hasheado
+    versao_modelo = f"{versao_vendas}_{min_compras_cliente}_{min_compras_produto}"
+    matriz, cust_index, prod_index = obter_matriz_interacao(
+        _df_vendas, versao_modelo, min_compras_cliente, min_compras_produto
     )
-    return df_similaridade
+    matriz_norm = normalize(matriz, norm='l2', axis=1)
+    
+    embeddings = indice = None
+    if matriz.nnz > LIMITE_NNZ_BUSCA_EXATA:
+        embeddings = obter_embeddings(matriz_norm, versao_modelo)
+        if len(cust_index) > LIMITE_CLIENTES_VARREDURA:
+            indice = criar_indice_vizinhos(embeddings, versao_modelo)
+        else:
+            embeddings = quantizar_embeddings(embeddings)
+            
+            # Compila o kernel numba agora, ainda sob o spinner de carregamento
+            similaridades_embeddings(embeddings, embeddings[0])
+    return matriz, matriz_norm, cust_index, prod_index, embeddings, indice
+
+# Função para buscar clientes similares
+def buscar_vizinhos(row_id, matriz_norm, embeddings, indice, n_vizinhos):
+    """Busca os clientes mais similares pela similaridade de cosseno exata"""
+    if embeddings is None:
+        # Varredura esparsa exata: um produto matriz-vetor (vetor denso) sobre as linhas normalizadas
+        similaridades = matriz_norm @ matriz_norm[row_id].toarray().ravel()
+        similaridades[row_id] = -np.inf
+        idx = top_k(similaridades, n_vizinhos)
+        return idx, similaridades[idx]
+    
+    # Bases grandes: candidatos pelos embeddings (aproximados), depois cosseno exato
+    n_candidatos = n_vizinhos * FATOR_CANDIDATOS
+    if indice is None:
+        similaridades = similaridades_embeddings(embeddings, embeddings[row_id])
+        similaridades[row_id] = -np.inf
+        candidatos = top_k(similaridades, n_candidatos)
+    else:
+        candidatos = np.array(indice.get_nns_by_item(row_id, n_candidatos + 1), dtype=np.intp)
+        candidatos = candidatos[candidatos != row_id]
+    
+    # Similaridade exata apenas para os candidatos (matrizes já normalizadas); em ordem de
+    # linha, para que empates sejam desfeitos como na varredura exata
+    candidatos = np.sort(candidatos)
+    similaridades = matriz_norm[candidatos] @ matriz_norm[row_id].toarray().ravel()
+    idx = top_k(similaridades, n_vizinhos)
+    return candidatos[idx], similaridades[idx]
+
+# Função para selecionar os k maiores valores
+def top_k(valores, k, desempate=None):
+    """Retorna as posições dos k maiores valores finitos, em ordem decrescente
+    (empates: maior `desempate` primeiro, depois menor posição)"""
+    k = min(k, len(valores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    
+    # Seleção O(N) do k-ésimo maior valor; todos os empatados com ele entram na ordenação,
+    # para que o corte em k não dependa da ordem arbitrária do argpartition
+    limite = np.partition(valores, len(valores) - k)[len(valores) - k]
+    idx = np.flatnonzero(valores >= limite)
+    chaves = (idx, -valores[idx]) if desempate is None else (idx, -desempate[idx], -valores[idx])
+    idx = idx[np.lexsort(chaves)][:k]
+    return idx[np.isfinite(valores[idx])]
+
+# Função para obter os produtos comprados por um cliente (linha da matriz)
+def produtos_do_cliente(matriz, row_id, prod_index):
+    """Retorna o conjunto de ProductKeys comprados pelo cliente"""
+    return set(prod_index[matriz.getrow(row_id).indices])
+
+# Função para mapear clientes para posições em df_clientes e linhas da matriz
+@st.cache_resource
+def mapear_clientes(_df_clientes, _cust_index, versao_clientes, versao_vendas, min_compras_cliente, min_compras_produto):
+    """Cria dicionários nome -> posição em df_clientes, nome -> linha da matriz e ID -> nome"""
+    # O cache é indexado pelas versões dos dados; DataFrame e índice não são hasheados
+    # Em nomes repetidos vale o primeiro cliente, como na seleção original
+    posicoes = np.flatnonzero(~_df_clientes['nome_completo'].duplicated().to_numpy())
+    nomes = _df_clientes['nome_completo'].to_numpy()[posicoes]
+    row_ids = _cust_index.get_indexer(_df_clientes['CustomerKey'].to_numpy()[posicoes])
+    
+    nome_to_pos = dict(zip(nomes, posicoes))
+    nome_to_rowid = dict(zip(nomes, row_ids))
+    id_to_nome = _df_clientes.set_index('CustomerKey')['nome_completo'].to_dict()
+    return nome_to_pos, nome_to_rowid, id_to_nome
+
+# Função para mapear produtos para seus nomes
+@st.cache_resource
+def mapear_produtos(_df_produtos, versao_produtos):
+    """Cria o dicionário ProductKey -> nome do produto (cache indexado por versao_produtos)"""
+    return dict(zip(_df_produtos['ProductKey'], _df_produtos['ProductName']))
+
+# Função para mapear clientes para seus primeiros nomes
+@st.cache_resource
+def mapear_primeiros_nomes(_df_clientes, versao_clientes):
+    """Cria o dicionário CustomerKey -> primeiro nome (cache indexado por versao_clientes)"""
+    return dict(zip(_df_clientes['CustomerKey'], _df_clientes['primeiro_nome']))
 
 # Função para obter recomendações
-def obter_recomendacoes(cliente_id, matriz, df_similaridade, n_vizinhos=5):
-   
-    """Obtém recomendações para um cliente específico"""
+@st.cache_data(show_spinner=False, max_entries=1000)
+def obter_recomendacoes(row_id, _matriz, _matriz_norm, _cust_index, _prod_index, _embeddings, _indice,
+                        versao_vendas, min_compras_cliente, min_compras_produto, n_vizinhos=5):
+    """Obtém recomendações para um cliente específico (linha da matriz; -1 se não há compras)"""
+    # O cache é indexado pelo cliente, pela versão do modelo e por n_vizinhos; o modelo não é hasheado
+    if row_id < 0:
+        vazio = np.empty(0, dtype=np.float32)
+        return set(), _cust_index.to_numpy()[:0], vazio, _prod_index.to_numpy()[:0], vazio, np.empty(0, dtype=np.int32)
+    
     # Produtos que o cliente já comprou
-    produtos_comprados = set(matriz.loc[cliente_id][matriz.loc[cliente_id] > 0].index)
+    produtos_comprados = produtos_do_cliente(_matriz, row_id, _prod_index)
     
     # Encontrar clientes similares (excluindo o próprio)
-    similares = df_similaridade[cliente_id].sort_values(ascending=False)[1:n_vizinhos+1]
+    idx, vizinhos_scores = buscar_vizinhos(row_id, _matriz_norm, _embeddings, _indice, n_vizinhos)
+    vizinhos_ids = _cust_index.to_numpy()[idx]
     
     # Coletar produtos dos vizinhos que o cliente não comprou
-    recomendacoes = {}
+    if len(idx) == 0:
+        return (produtos_comprados, vizinhos_ids, vizinhos_scores,
+                _prod_index.to_numpy()[:0], vizinhos_scores[:0], np.empty(0, dtype=np.int32))
     
-    for vizinho_id, similaridade_score in similares.items():
-        produtos_vizinho = set(matriz.loc[vizinho_id][matriz.loc[vizinho_id] > 0].index)
-        produtos_novos = produtos_vizinho - produtos_comprados
-        
-        for produto in produtos_novos:
-            if produto not in recomendacoes:
-                recomendacoes[produto] = {
-                    'score': similaridade_score,
-                    'vizinhos': [vizinho_id]
-                }
-            else:
-                # Atualizar score (média ponderada)
-                recomendacoes[produto]['vizinhos'].append(vizinho_id)
-                recomendacoes[produto]['score'] = max(recomendacoes[produto]['score'], similaridade_score)
-    
-    # Ordenar recomendações por score
-    recomendacoes_ordenadas = sorted(
-        recomendacoes.items(),
-        key=lambda x: x[1]['score'],
-        reverse=True
-    )
+    # Matriz binária vizinhos x produtos: score = maior similaridade entre os vizinhos que compraram
+    linhas_vizinhos = _matriz[idx]
+    contagem_vizinhos = np.asarray(linhas_vizinhos.sum(axis=0)).ravel()
+    scores = linhas_vizinhos.multiply(vizinhos_scores[:, None]).max(axis=0).toarray().ravel()
     
-    return produtos_comprados, similares, recomendacoes_ordenadas
+    # Descartar produtos que nenhum vizinho comprou ou que o cliente já possui
+    linha_cliente = _matriz[row_id]
+    scores[contagem_vizinhos == 0] = -np.inf
+    scores[linha_cliente.indices] = -np.inf
+    
+    # Ordenar recomendações por score (arrays paralelos: produto, score, nº de vizinhos)
+    # Empates de score (produtos do mesmo vizinho) favorecem os comprados por mais vizinhos
+    produtos_idx = top_k(scores, int(np.isfinite(scores).sum()), desempate=contagem_vizinhos)
+    rec_produtos = _prod_index.to_numpy()[produtos_idx]
+    rec_scores = scores[produtos_idx]
+    rec_contagens = contagem_vizinhos[produtos_idx].astype(np.int32)
+    
+    return produtos_comprados, vizinhos_ids, vizinhos_scores, rec_produtos, rec_scores, rec_contagens
 
 # Interface principal
 def main():
     # Carregar dados
     with st.spinner("Carregando dados do banco..."):
         try:
-            df_vendas, df_produtos, df_clientes = carregar_dados()
-            
-            # Criar matriz de interação
-            matriz = criar_matriz_interacao(df_vendas)
-            
-            # Calcular similaridades
-            df_similaridade = calcular_similaridades(matriz)
-            
-            st.success("✅ Dados carregados com sucesso!")
+            (df_vendas, df_produtos, df_clientes,
+             versao_vendas, versao_clientes, versao_produtos) = carregar_dados(date.today().isoformat())
         except Exception as e:
             st.error(f"Erro ao carregar dados: {e}")
             st.stop()
@@ -157,6 +365,39 @@ def main():
     # Sidebar para seleção do cliente
     st.sidebar.header("🔍 Configurações")
     
+    # Filtros de cold start (aplicados antes de construir a matriz)
+    with st.sidebar.expander("🧊 Filtros de cold start"):
+        min_compras_cliente = st.slider(
+            "Mínimo de produtos por cliente:",
+            min_value=1,
+            max_value=10,
+            value=2
+        )
+        min_compras_produto = st.slider(
+            "Mínimo de clientes por produto:",
+            min_value=1,
+            max_value=20,
+            value=5
+        )
+    
+    with st.spinner("Preparando o modelo..."):
+        try:
+            # Criar matriz de interação normalizada (em cache entre as interações)
+            matriz, matriz_norm, cust_index, prod_index, embeddings, indice = preparar_modelo(
+                df_vendas, versao_vendas, min_compras_cliente, min_compras_produto
+            )
+            nome_to_pos, nome_to_rowid, id_to_nome = mapear_clientes(
+                df_clientes, cust_index, versao_clientes, versao_vendas,
+                min_compras_cliente, min_compras_produto
+            )
+            prod_name = mapear_produtos(df_produtos, versao_produtos)
+            primeiro_nome = mapear_primeiros_nomes(df_clientes, versao_clientes)
+            
+            st.success("✅ Dados carregados com sucesso!")
+        except Exception as e:
+            st.error(f"Erro ao carregar dados: {e}")
+            st.stop()
+    
     # Seleção do cliente
     clientes_disponiveis = df_clientes['nome_completo'].tolist()
     cliente_selecionado = st.sidebar.selectbox(
@@ -165,11 +406,9 @@ def main():
         index=0
     )
     
-    # Obter ID do cliente selecionado
-    cliente_id = df_clientes.loc[
-        df_clientes['nome_completo'] == cliente_selecionado, 
-        'CustomerKey'
-    ].values[0]
+    # Obter posição do cliente selecionado e sua linha na matriz
+    cliente_info = df_clientes.iloc[nome_to_pos[cliente_selecionado]]
+    row_id = nome_to_rowid[cliente_selecionado]
     
     # Número de vizinhos para considerar
     n_vizinhos = st.sidebar.slider(
@@ -191,7 +430,6 @@ def main():
     st.sidebar.markdown("---")
     st.sidebar.subheader("📋 Informações do Cliente")
     
-    cliente_info = df_clientes[df_clientes['CustomerKey'] == cliente_id].iloc[0]
     st.sidebar.write(f"**ID:** {cliente_info['CustomerKey']}")
     st.sidebar.write(f"**Nome:** {cliente_info['nome_completo']}")
     st.sidebar.write(f"**Email:** {cliente_info['EmailAddress']}")
@@ -199,8 +437,10 @@ def main():
     
     
     # Processar recomendações
-    produtos_comprados, clientes_similares, recomendacoes = obter_recomendacoes(
-        cliente_id, matriz, df_similaridade, n_vizinhos
+    (produtos_comprados, vizinhos_ids, vizinhos_scores,
+     rec_produtos, rec_scores, rec_contagens) = obter_recomendacoes(
+        row_id, matriz, matriz_norm, cust_index, prod_index, embeddings, indice,
+        versao_vendas, min_compras_cliente, min_compras_produto, n_vizinhos
     )
     
     # Layout principal
@@ -219,9 +459,7 @@ def main():
         with tab1:
             if produtos_comprados:
                 # Converter IDs de produtos para nomes
-                produtos_comprados_nomes = df_produtos[
-                    df_produtos['ProductKey'].isin(produtos_comprados)
-                ]['ProductName'].tolist()
+                produtos_comprados_nomes = [prod_name[k] for k in sorted(produtos_comprados)]
                 
                 st.write(f"**Total de produtos comprados:** {len(produtos_comprados)}")
                 
@@ -232,46 +470,42 @@ def main():
                 if len(produtos_comprados_nomes) > 20:
                     st.write(f"... e mais {len(produtos_comprados_nomes) - 20} produtos")
             else:
-                st.info("Este cliente ainda não realizou compras.")
+                st.info("Este cliente não tem compras consideradas pelo modelo (sem compras ou abaixo dos filtros de cold start).")
         
         with tab2:
-            if recomendacoes:
+            if len(rec_produtos) > 0:
                 st.write(f"**Recomendações baseadas em {n_vizinhos} clientes similares:**")
                 
-                for i, (produto_id, info) in enumerate(recomendacoes[:n_recomendacoes], 1):
-                    produto_nome = df_produtos[
-                        df_produtos['ProductKey'] == produto_id
-                    ]['ProductName'].values[0]
-                    
-                    # Calcular percentual de confiança
-                    confianca_percentual = info['score'] * 100
+                # Percentuais de confiança calculados de uma vez para as recomendações exibidas
+                scores_exibidos = rec_scores[:n_recomendacoes]
+                confiancas_percentuais = scores_exibidos * 100
+                
+                for i, (produto_id, score, confianca_percentual, contagem) in enumerate(zip(
+                    rec_produtos[:n_recomendacoes], scores_exibidos,
+                    confiancas_percentuais, rec_contagens[:n_recomendacoes]
+                ), 1):
+                    produto_nome = prod_name[produto_id]
                     
                     # Criar métrica visual
                     st.markdown(f"### {i}. {produto_nome}")
-                    st.progress(float(info['score']))
+                    st.progress(float(score))
                     st.write(f"**Confiança:** {confianca_percentual:.2f}%")
-                    st.write(f"**Baseado em:** {len(info['vizinhos'])} cliente(s) similar(es)")
+                    st.write(f"**Baseado em:** {contagem} cliente(s) similar(es)")
                     st.write("---")
             else:
                 st.info("Não há recomendações disponíveis para este cliente.")
         
         with tab3:
-            if not clientes_similares.empty:
-                st.write(f"**Top {len(clientes_similares)} clientes mais similares:**")
+            if len(vizinhos_ids) > 0:
+                st.write(f"**Top {len(vizinhos_ids)} clientes mais similares:**")
                 
                 # Criar DataFrame para visualização
                 similares_df = pd.DataFrame({
-                    'ID do Cliente': clientes_similares.index,
-                    'Similaridade': (clientes_similares.values * 100).round(2)
+                    'nome_completo': [id_to_nome[vizinho_id] for vizinho_id in vizinhos_ids],
+                    'ID do Cliente': vizinhos_ids,
+                    'Similaridade': (vizinhos_scores.astype(np.float64) * 100).round(2)
                 })
                 
-                # Adicionar nomes dos clientes
-                similares_df = similares_df.merge(
-                    df_clientes[['CustomerKey', 'nome_completo']],
-                    left_on='ID do Cliente',
-                    right_on='CustomerKey'
-                )
-                
                 # Mostrar tabela
                 st.dataframe(
                     similares_df[['nome_completo', 'ID do Cliente', 'Similaridade']],
@@ -311,22 +545,22 @@ def main():
                 value=len(produtos_comprados)
             )
             
-            if recomendacoes:
+            if len(rec_produtos) > 0:
                 st.metric(
                     label="Recomendações Disponíveis",
-                    value=len(recomendacoes)
+                    value=len(rec_produtos)
                 )
         
         with metric_col2:
             st.metric(
                 label="Clientes Similares",
-                value=len(clientes_similares)
+                value=len(vizinhos_ids)
             )
             
-            if clientes_similares.empty:
+            if len(vizinhos_ids) == 0:
                 similaridade_max = 0
             else:
-                similaridade_max = clientes_similares.max() * 100
+                similaridade_max = vizinhos_scores.max() * 100
                 st.metric(
                     label="Similaridade Máxima",
                     value=f"{similaridade_max:.1f}%"
@@ -337,46 +571,48 @@ def main():
         # Visualização da matriz de similaridade (simplificada)
         st.subheader("🔗 Rede de Similaridade")
         
-        if not clientes_similares.empty:
+        if len(vizinhos_ids) > 0:
             # Criar gráfico de rede simplificado
             fig = go.Figure()
             
-            # Adicionar nós
+            # Posições dos clientes similares em círculo ao redor do cliente selecionado
+            k = len(vizinhos_ids)
+            angles = np.arange(1, k + 1) * 2 * np.pi / k
+            xs = np.cos(angles)
+            ys = np.sin(angles)
+            vizinhos_nomes = [primeiro_nome[vizinho_id] for vizinho_id in vizinhos_ids]
+            
+            # Linhas de conexão: um único traço, segmentos separados por NaN
+            fig.add_trace(go.Scatter(
+                x=np.column_stack([np.zeros(k), xs, np.full(k, np.nan)]).ravel(),
+                y=np.column_stack([np.zeros(k), ys, np.full(k, np.nan)]).ravel(),
+                mode='lines',
+                line=dict(width=1.5, color='gray'),
+                hoverinfo='skip',
+                showlegend=False
+            ))
+            
+            # Cliente selecionado (desenhado sobre as linhas)
             fig.add_trace(go.Scatter(
                 x=[0], y=[0],
                 mode='markers+text',
                 marker=dict(size=30, color='red'),
-                text=[cliente_selecionado.split()[0]],
+                text=[cliente_info['primeiro_nome']],
                 textposition="top center",
                 name="Cliente Selecionado"
             ))
             
-            # Adicionar clientes similares
-            for i, (vizinho_id, score) in enumerate(clientes_similares.items(), 1):
-                angle = (i * 2 * np.pi) / len(clientes_similares)
-                x = np.cos(angle)
-                y = np.sin(angle)
-                
-                vizinho_nome = df_clientes[
-                    df_clientes['CustomerKey'] == vizinho_id
-                ]['nome_completo'].values[0].split()[0]
-                
-                fig.add_trace(go.Scatter(
-                    x=[x], y=[y],
-                    mode='markers+text',
-                    marker=dict(size=20, color='blue'),
-                    text=[vizinho_nome],
-                    textposition="top center",
-                    name=f"Similaridade: {score*100:.1f}%"
-                ))
-                
-                # Adicionar linha de conexão
-                fig.add_trace(go.Scatter(
-                    x=[0, x], y=[0, y],
-                    mode='lines',
-                    line=dict(width=score*3, color='gray'),
-                    showlegend=False
-                ))
+            # Clientes similares: um único traço para todos os nós
+            fig.add_trace(go.Scatter(
+                x=xs, y=ys,
+                mode='markers+text',
+                marker=dict(size=20, color='blue'),
+                text=vizinhos_nomes,
+                textposition="top center",
+                hovertext=[f"Similaridade: {score*100:.1f}%" for score in vizinhos_scores],
+                hoverinfo='text',
+                name="Clientes Similares"
+            ))
             
             fig.update_layout(
                 title="Relação com Clientes Similares",
@@ -391,9 +627,11 @@ def main():
         
         # Detalhes técnicos
         with st.expander("🔧 Detalhes Técnicos"):
-            st.write(f"**Total de clientes na base:** {len(matriz)}")
-            st.write(f"**Total de produtos na base:** {len(matriz.columns)}")
-            st.write(f"**Densidade da matriz:** {(matriz > 0).sum().sum() / (matriz.shape[0] * matriz.shape[1]) * 100:.2f}%")
+            # Densidade direto do CSR: O(1), sem materializar a matriz booleana
+            densidade = matriz.nnz / max(matriz.shape[0] * matriz.shape[1], 1)
+            st.write(f"**Total de clientes na base:** {matriz.shape[0]}")
+            st.write(f"**Total de produtos na base:** {matriz.shape[1]}")
+            st.write(f"**Densidade da matriz:** {densidade * 100:.2f}%")
     
     # Rodapé
     st.markdown("---")